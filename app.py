@@ -1,12 +1,25 @@
-from flask import Flask, render_template, request
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.templating import Jinja2Templates
+from google.api_core import exceptions as gax_exceptions
 from health_agent import (
+    CHECK_FALLBACKS,
+    InstanceRow,
+    ProjectContext,
+    degraded_checks,
     get_project_cpu_avg,
     get_project_mem_avg,
     list_running_vms,
     get_per_instance_breakdown,
 )
 
-app = Flask(__name__)
+app = FastAPI()
+templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
 
 PROJECTS = [
     "km-prod",
@@ -17,26 +30,112 @@ PROJECTS = [
     "km-dev-434106",
 ]
 
-@app.route("/", methods=["GET", "POST"])
-def index():
-    project_id = request.form.get("project_id")
+
+def _require_known_project(project_id: str) -> None:
+    # Only configured projects are queried (and get circuit breakers / cache entries).
+    if project_id not in PROJECTS:
+        raise HTTPException(status_code=400, detail=f"Unknown project: {project_id}")
+
+
+def _project_checks(project_id: str) -> List[Tuple[str, Awaitable[Any]]]:
+    ctx = ProjectContext(project_id)
+    return [
+        ("cpu", get_project_cpu_avg(project_id, ctx)),
+        ("memory", get_project_mem_avg(project_id, ctx)),
+        ("vms", list_running_vms(project_id, ctx)),
+        ("per_instance", get_per_instance_breakdown(project_id, ctx)),
+    ]
+
+
+async def _run_check(check: str, pending: Awaitable[Any]) -> Tuple[str, Any, bool]:
+    # A failing GCP call degrades its own section instead of failing the page.
+    try:
+        return check, await pending, False
+    except gax_exceptions.GoogleAPIError:
+        return check, CHECK_FALLBACKS[check], True
+
+
+def _degraded(project_id: str, failed: List[str]) -> List[str]:
+    degraded = degraded_checks(project_id)
+    return degraded + [check for check in failed if check not in degraded]
+
+
+def _fmt_cpu(cpu_avg: float) -> str:
+    return f"{cpu_avg*100:.2f}%" if cpu_avg == cpu_avg else "N/A"
+
+
+def _fmt_mem(mem_avg: float) -> str:
+    return f"{mem_avg:.2f}%" if mem_avg == mem_avg else "N/A"
+
+
+@app.api_route("/", methods=["GET", "POST"], response_class=HTMLResponse)
+async def index(request: Request, project_id: Optional[str] = Form(None)):
     result = None
     if project_id:
-        cpu_avg = get_project_cpu_avg(project_id)
-        mem_avg = get_project_mem_avg(project_id)
-        vm_count, vms = list_running_vms(project_id)
-        per_instance = get_per_instance_breakdown(project_id)
+        _require_known_project(project_id)
+        results = await asyncio.gather(*(_run_check(c, p) for c, p in _project_checks(project_id)))
+        values = {check: value for check, value, _ in results}
+        vm_count, vms = values["vms"]
 
         result = {
             "project": project_id,
-            "cpu_avg": f"{cpu_avg*100:.2f}%" if cpu_avg == cpu_avg else "N/A",
-            "mem_avg": f"{mem_avg:.2f}%" if mem_avg == mem_avg else "N/A",
+            "cpu_avg": _fmt_cpu(values["cpu"]),
+            "mem_avg": _fmt_mem(values["memory"]),
             "vm_count": vm_count,
-            "instances": per_instance,
+            "instances": values["per_instance"],
+            "degraded": _degraded(project_id, [check for check, _, failed in results if failed]),
         }
 
-    return render_template("index.html", projects=PROJECTS, result=result)
+    return templates.TemplateResponse(request, "index.html", {"projects": PROJECTS, "result": result})
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _row_payload(row: InstanceRow) -> Dict[str, Any]:
+    # NaN is not valid JSON for the browser's JSON.parse.
+    mem = row.memory_used_pct
+    return {
+        "instance": row.instance,
+        "zone": row.zone,
+        "machineType": row.machineType,
+        "cpu_utilization_pct": row.cpu_utilization_pct,
+        "memory_used_pct": mem if mem == mem else None,
+    }
+
+
+@app.get("/stream")
+async def stream(project_id: str):
+    """Server-Sent Events: each check is sent as soon as it completes."""
+    _require_known_project(project_id)
+
+    async def events() -> AsyncIterator[str]:
+        failed = []
+        for next_done in asyncio.as_completed([_run_check(c, p) for c, p in _project_checks(project_id)]):
+            check, value, check_failed = await next_done
+            if check_failed:
+                failed.append(check)
+            if check == "cpu":
+                yield _sse("cpu", {"value": _fmt_cpu(value)})
+            elif check == "memory":
+                yield _sse("memory", {"value": _fmt_mem(value)})
+            elif check == "vms":
+                yield _sse("vms", {"count": value[0]})
+            else:
+                for row in value:
+                    yield _sse("instance", _row_payload(row))
+        yield _sse("degraded", {"checks": _degraded(project_id, failed)})
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080)
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8080)
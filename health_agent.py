@@ -2,159 +2,560 @@
 """
 Helper functions for GCP Project Health Agent
 ---------------------------------------------
-Provides:
+Provides (all coroutines; Monitoring uses the gRPC asyncio client, the
+sync-only Compute client runs in a worker thread):
 - get_project_cpu_avg
 - get_project_mem_avg
 - list_running_vms
 - get_per_instance_breakdown
+- get_scoped_project_avgs / get_scoped_per_instance_breakdown, which answer
+  for many projects in one ListTimeSeries call via a metrics scope
+
+Pass one ProjectContext to all four calls for the same project so they
+share a single instances.aggregatedList walk.
+
+Throttled/unavailable calls are retried with backoff. After repeated
+failures a per-(project, check) circuit breaker opens and the check
+returns its empty fallback until the cooldown passes; degraded_checks()
+reports which checks are short-circuited.
 """
 
+import asyncio
 import datetime as dt
-from typing import Dict, List, Tuple
+import functools
+import inspect
+import logging
+import threading
+import time
+import weakref
+from collections import defaultdict
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, TypeVar
 
-from google.cloud import monitoring_v3
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from cachetools import LRUCache, TTLCache
+from google.api_core import exceptions as gax_exceptions
+from google.api_core import retry as gax_retry
+from google.api_core import retry_async as gax_retry_async
+from google.cloud import compute_v1, monitoring_v3
+
+log = logging.getLogger(__name__)
 
 ALIGN_SECONDS = 600  # 10 minutes
+# Monitoring points land 60-240s behind wall clock; ending the window this far
+# back keeps the last aligned bucket populated (as stackdriver_exporter does).
+INGEST_LAG_SECONDS = 180
+CPU_METRIC = "compute.googleapis.com/instance/cpu/utilization"
+MEM_METRIC = "agent.googleapis.com/memory/percent_used"
 
+# instances.aggregatedList is filtered server-side to RUNNING VMs and trimmed to
+# the fields we read (X-Goog-FieldMask system parameter), plus nextPageToken so
+# the pager keeps following pages.
+_INSTANCE_FILTER = "status = RUNNING"
+_INSTANCE_FIELDS = "nextPageToken,items/*/instances(id,name,zone,machineType)"
+_INSTANCE_PAGE_SIZE = 500
+_INSTANCE_ATTRS = attrgetter("id", "name", "zone", "machine_type")
 
-def _now_interval(seconds: int = ALIGN_SECONDS) -> Tuple[dt.datetime, dt.datetime]:
-    now = dt.datetime.utcnow().replace(tzinfo=dt.timezone.utc)
-    start = now - dt.timedelta(seconds=seconds)
-    return start, now
+# name_map values: (name, zone, machineType), zone/type reduced to their last path segment.
+NameMap = Dict[str, Tuple[str, str, str]]
 
+# VM inventory changes rarely; reuse a project's name_map across requests.
+NAME_MAP_TTL_SECONDS = 120
+_NAME_MAP_CACHE: TTLCache = TTLCache(maxsize=32, ttl=NAME_MAP_TTL_SECONDS)
+_NAME_MAP_CACHE_LOCK = threading.Lock()
 
-def _ts_request_common(project_id: str, metric_type: str) -> monitoring_v3.ListTimeSeriesRequest:
-    start, end = _now_interval()
-    interval = monitoring_v3.TimeInterval({
-        "start_time": {"seconds": int(start.timestamp())},
-        "end_time": {"seconds": int(end.timestamp())},
-    })
-    aggregation = monitoring_v3.Aggregation({
+# Repeat page loads within half an alignment window reuse the previous answer.
+RESULT_TTL_SECONDS = ALIGN_SECONDS // 2
+
+_T = TypeVar("_T")
+
+
+def _ttl_cached(fn: Callable[..., Awaitable[_T]]) -> Callable[..., Awaitable[_T]]:
+    """Cache a coroutine's result (not the coroutine) per argument set.
+
+    ctx itself is not part of the key, but its offset is, since it changes the
+    query window. Results are shared between callers, so decorated functions
+    must return immutable values. Only successful results are stored; failures
+    are retried on the next call.
+    """
+    cache: TTLCache = TTLCache(maxsize=64, ttl=RESULT_TTL_SECONDS)
+    lock = threading.Lock()
+    sig = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> _T:
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        ctx = bound.arguments.get("ctx")
+        offset = ctx.offset if ctx is not None else INGEST_LAG_SECONDS
+        key = (*(v for k, v in bound.arguments.items() if k != "ctx"), offset)
+        with lock:
+            if key in cache:
+                return cache[key]
+        result = await fn(*args, **kwargs)
+        with lock:
+            cache[key] = result
+        return result
+
+    wrapper.cache = cache  # type: ignore[attr-defined]
+    return wrapper
+
+
+# Quota throttling and transient outages are retried with exponential backoff
+# (0.5s doubling to 4s) until RETRY_DEADLINE_SECONDS have passed. Each attempt
+# (each page, for paged calls) is capped at CALL_TIMEOUT_SECONDS, and an attempt
+# started just before the deadline runs to completion, so one call can take up
+# to RETRY_DEADLINE_SECONDS + CALL_TIMEOUT_SECONDS (~28s) in the worst case.
+CALL_TIMEOUT_SECONDS = 20
+RETRY_DEADLINE_SECONDS = 8.0
+_RETRYABLE = gax_retry.if_exception_type(gax_exceptions.ResourceExhausted, gax_exceptions.ServiceUnavailable)
+_MONITORING_RETRY = gax_retry_async.AsyncRetry(
+    predicate=_RETRYABLE, initial=0.5, maximum=4.0, multiplier=2.0, timeout=RETRY_DEADLINE_SECONDS
+)
+_COMPUTE_RETRY = gax_retry.Retry(
+    predicate=_RETRYABLE, initial=0.5, maximum=4.0, multiplier=2.0, timeout=RETRY_DEADLINE_SECONDS
+)
+
+BREAKER_FAIL_MAX = 3
+BREAKER_RESET_SECONDS = 60
+
+
+class _CircuitBreaker:
+    """Opens after BREAKER_FAIL_MAX consecutive failures, for BREAKER_RESET_SECONDS.
+
+    After the cooldown it is half-open: exactly one caller is let through as a
+    probe while the others keep getting the fallback. A successful probe closes
+    the breaker; a failed one reopens it for another cooldown.
+    """
+
+    def __init__(self) -> None:
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are short-circuited (cooling down or a probe is in flight)."""
+        if self._opened_at is None:
+            return False
+        return self._probing or time.monotonic() - self._opened_at < BREAKER_RESET_SECONDS
+
+    def allow(self) -> bool:
+        """Whether this call may go to the API; claims the probe slot when half-open."""
+        if self._opened_at is None:
+            return True
+        if self.is_open:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or self._failures >= BREAKER_FAIL_MAX:
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """Give up the probe slot without a verdict (e.g. the call was cancelled)."""
+        self._probing = False
+
+
+# project_id -> check -> breaker. Bounded so arbitrary project ids cannot grow
+# it without limit; evicting a project only forgets its failure history.
+_BREAKERS: LRUCache = LRUCache(maxsize=64)
+
+
+def _breakers_for(project_id: str) -> Dict[str, _CircuitBreaker]:
+    breakers = _BREAKERS.get(project_id)
+    if breakers is None:
+        breakers = _BREAKERS[project_id] = defaultdict(_CircuitBreaker)
+    return breakers
+
+
+# Check name (as reported by degraded_checks) -> value returned while its
+# breaker is open. All immutable, so one object is safely shared by callers.
+CHECK_FALLBACKS: Dict[str, Any] = {
+    "cpu": float("nan"),
+    "memory": float("nan"),
+    "vms": (0, ()),
+    "per_instance": (),
+}
+
+
+def _circuit_breaker(check: str):
+    """Short-circuit fn(project_id, ...) to CHECK_FALLBACKS[check] while its breaker is open.
+
+    Applied outside _ttl_cached so fallbacks are never cached.
+    """
+    fallback = CHECK_FALLBACKS[check]
+
+    def decorator(fn: Callable[..., Awaitable[_T]]) -> Callable[..., Awaitable[_T]]:
+        @functools.wraps(fn)
+        async def wrapper(project_id: str, *args: Any, **kwargs: Any) -> _T:
+            breaker = _breakers_for(project_id)[check]
+            if not breaker.allow():
+                return fallback
+            try:
+                result = await fn(project_id, *args, **kwargs)
+            except gax_exceptions.GoogleAPIError:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.release_probe()
+                raise
+            breaker.record_success()
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def degraded_checks(project_id: str) -> List[str]:
+    """Names of the checks currently short-circuited for project_id."""
+    breakers = _BREAKERS.get(project_id) or {}
+    return [check for check, breaker in breakers.items() if breaker.is_open]
+
+
+# Clients are expensive to build (credentials, TLS/HTTP2 channel), so reuse them.
+# The asyncio gRPC client is bound to the loop it was created on, hence one per
+# loop. InstancesClient has no async flavour; one instance is shared by the
+# worker threads (its pooled requests session keeps connections alive).
+_MONITORING_CLIENTS = weakref.WeakKeyDictionary()  # event loop -> MetricServiceAsyncClient
+_INSTANCES: Optional[compute_v1.InstancesClient] = None
+_INSTANCES_LOCK = threading.Lock()
+
+
+def _monitoring() -> monitoring_v3.MetricServiceAsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _MONITORING_CLIENTS.get(loop)
+    if client is None:
+        client = _MONITORING_CLIENTS[loop] = monitoring_v3.MetricServiceAsyncClient()
+    return client
+
+
+def _instances() -> compute_v1.InstancesClient:
+    global _INSTANCES
+    with _INSTANCES_LOCK:
+        if _INSTANCES is None:
+            _INSTANCES = compute_v1.InstancesClient()
+        return _INSTANCES
+
+
+@dataclass(frozen=True, slots=True)
+class RunningVm:
+    """One RUNNING instance as listed by list_running_vms."""
+    name: str
+    zone: str
+    machineType: str
+    id: str
+
+
+@dataclass(frozen=True, slots=True)
+class InstanceRow:
+    """One running VM's averages for the per-instance table."""
+    instance: str
+    zone: str
+    machineType: str
+    cpu_utilization_pct: float
+    memory_used_pct: float
+
+
+@dataclass
+class ProjectContext:
+    """Per-request state for one project; the query interval and name_map are built lazily, once."""
+    project_id: str
+    offset: int = INGEST_LAG_SECONDS
+    _interval: Optional[monitoring_v3.TimeInterval] = field(default=None, repr=False)
+    _name_map: Optional[NameMap] = field(default=None, repr=False)
+    _name_map_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def interval(self) -> monitoring_v3.TimeInterval:
+        """One window shared by every Monitoring call made for this request."""
+        if self._interval is None:
+            self._interval = _time_interval(self.offset)
+        return self._interval
+
+    @property
+    def name_map(self) -> NameMap:
+        """Running instance id -> name/zone/machineType, from one aggregatedList walk."""
+        with self._name_map_lock:
+            if self._name_map is None:
+                self._name_map = _cached_name_map(self.project_id)
+            return self._name_map
+
+
+def _cached_name_map(project_id: str) -> NameMap:
+    # The lock only guards the cache itself; the fetch runs outside it so
+    # different projects are not serialised behind one another.
+    with _NAME_MAP_CACHE_LOCK:
+        name_map = _NAME_MAP_CACHE.get(project_id)
+    if name_map is None:
+        name_map = _fetch_name_map(project_id)
+        with _NAME_MAP_CACHE_LOCK:
+            _NAME_MAP_CACHE[project_id] = name_map
+    return name_map
+
+
+def _fetch_name_map(project_id: str) -> NameMap:
+    req = compute_v1.AggregatedListInstancesRequest(
+        project=project_id,
+        filter=_INSTANCE_FILTER,
+        max_results=_INSTANCE_PAGE_SIZE,
+    )
+    name_map = {}
+    pager = _instances().aggregated_list(
+        request=req,
+        retry=_COMPUTE_RETRY,
+        timeout=CALL_TIMEOUT_SECONDS,
+        metadata=[("x-goog-fieldmask", _INSTANCE_FIELDS)],
+    )
+    for _, scoped in pager:
+        for inst in scoped.instances:
+            iid, iname, izone, itype = _INSTANCE_ATTRS(inst)
+            # Monitoring's instance_id label is a string; the proto id is an int.
+            name_map[str(iid)] = (iname, izone.rpartition("/")[2], itype.rpartition("/")[2])
+    return name_map
+
+
+# Static parts of every ListTimeSeries request, built once at import.
+_CPU_FILTER = f'metric.type = "{CPU_METRIC}" AND resource.type = "gce_instance"'
+# percent_used has one series per state (used/free/cached/...); only "used" is wanted.
+_MEM_FILTER = f'metric.type = "{MEM_METRIC}" AND resource.type = "gce_instance" AND metric.label.state = "used"'
+_METRIC_FILTERS = {CPU_METRIC: _CPU_FILTER, MEM_METRIC: _MEM_FILTER}
+
+_INSTANCE_GROUP_BY = ["resource.label.instance_id", "resource.label.zone"]
+
+
+def _mean_aggregation(group_by: Sequence[str] = ()) -> monitoring_v3.Aggregation:
+    return monitoring_v3.Aggregation({
         "alignment_period": {"seconds": ALIGN_SECONDS},
         "per_series_aligner": monitoring_v3.Aggregation.Aligner.ALIGN_MEAN,
         "cross_series_reducer": monitoring_v3.Aggregation.Reducer.REDUCE_MEAN,
+        "group_by_fields": list(group_by),
     })
-    flt = (
-        f'metric.type = "{metric_type}" '
-        f'AND resource.type = "gce_instance"'
-    )
-    req = monitoring_v3.ListTimeSeriesRequest(
+
+
+# Server-side reduction: one series per project, or one per (instance, zone).
+# Grouping by project_id keeps that label on scoped results so they can be
+# dispatched back to each monitored project.
+_AGG_PROJECT_MEAN = _mean_aggregation()
+_AGG_INSTANCE_MEAN = _mean_aggregation(_INSTANCE_GROUP_BY)
+_AGG_SCOPED_PROJECT_MEAN = _mean_aggregation(["resource.label.project_id"])
+_AGG_SCOPED_INSTANCE_MEAN = _mean_aggregation(["resource.label.project_id", *_INSTANCE_GROUP_BY])
+
+
+def _now_interval(seconds: int = ALIGN_SECONDS, offset: int = INGEST_LAG_SECONDS) -> Tuple[dt.datetime, dt.datetime]:
+    now = dt.datetime.utcnow().replace(tzinfo=dt.timezone.utc)
+    end = now - dt.timedelta(seconds=offset)
+    start = end - dt.timedelta(seconds=seconds)
+    return start, end
+
+
+def _time_interval(offset: int = INGEST_LAG_SECONDS) -> monitoring_v3.TimeInterval:
+    start, end = _now_interval(offset=offset)
+    return monitoring_v3.TimeInterval({
+        "start_time": {"seconds": int(start.timestamp())},
+        "end_time": {"seconds": int(end.timestamp())},
+    })
+
+
+def _ts_request_common(
+    project_id: str,
+    flt: str,
+    interval: monitoring_v3.TimeInterval,
+    aggregation: monitoring_v3.Aggregation,
+    page_size: int = 0,
+) -> monitoring_v3.ListTimeSeriesRequest:
+    # FULL view is required: HEADERS omits the points we read.
+    return monitoring_v3.ListTimeSeriesRequest(
         name=f"projects/{project_id}",
         filter=flt,
         interval=interval,
         view=monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
         aggregation=aggregation,
+        page_size=page_size,
     )
-    return req
 
 
-def get_project_cpu_avg(project_id: str) -> float:
-    client = monitoring_v3.MetricServiceClient()
-    req = _ts_request_common(project_id, "compute.googleapis.com/instance/cpu/utilization")
-    series = list(client.list_time_series(request=req))
-    if not series:
-        return float("nan")
-    for ts in series:
+async def _series_values(
+    req: monitoring_v3.ListTimeSeriesRequest, label_keys: Tuple[str, ...]
+) -> Dict[Tuple[str, ...], float]:
+    """First point of each returned series, keyed by the given resource labels."""
+    vals = {}
+    async for ts in await _monitoring().list_time_series(
+        request=req, retry=_MONITORING_RETRY, timeout=CALL_TIMEOUT_SECONDS
+    ):
         if ts.points:
-            return ts.points[0].value.double_value
-    return float("nan")
+            labels = ts.resource.labels
+            vals[tuple(labels.get(k, "") for k in label_keys)] = ts.points[0].value.double_value
+    return vals
 
 
-def get_project_mem_avg(project_id: str) -> float:
-    client = monitoring_v3.MetricServiceClient()
-    req = _ts_request_common(project_id, "agent.googleapis.com/memory/percent_used")
-    series = list(client.list_time_series(request=req))
-    if not series:
+async def _project_metric_avg(ctx: ProjectContext, metric_type: str) -> float:
+    req = _ts_request_common(
+        ctx.project_id,
+        _METRIC_FILTERS[metric_type],
+        ctx.interval,
+        _AGG_PROJECT_MEAN,
+        page_size=1,
+    )
+    # REDUCE_MEAN without group_by collapses every instance into one series, so
+    # the first page holds the whole answer: page_size caps its points (FULL
+    # view) to the newest one, and later pages are never fetched.
+    pager = await _monitoring().list_time_series(request=req, retry=_MONITORING_RETRY, timeout=CALL_TIMEOUT_SECONDS)
+    series = pager.time_series
+    if len(series) != 1:
+        if series:
+            log.warning("%s: expected one reduced %s series, got %d", ctx.project_id, metric_type, len(series))
         return float("nan")
-    for ts in series:
-        if ts.points:
-            return ts.points[0].value.double_value
-    return float("nan")
-
-
-def list_running_vms(project_id: str) -> Tuple[int, List[Dict]]:
-    compute = build("compute", "v1", cache_discovery=False)
-    req = compute.instances().aggregatedList(project=project_id)
-    result = []
-    while req is not None:
-        resp = req.execute()
-        for zone, data in resp.get("items", {}).items():
-            for inst in data.get("instances", []) if data.get("instances") else []:
-                if inst.get("status") == "RUNNING":
-                    result.append({
-                        "name": inst.get("name"),
-                        "zone": inst.get("zone", "").split("/")[-1],
-                        "machineType": inst.get("machineType", "").split("/")[-1],
-                        "id": inst.get("id"),
-                    })
-        req = compute.instances().aggregatedList_next(previous_request=req, previous_response=resp)
+    points = series[0].points
+    if not points:
+        return float("nan")
+    return points[0].value.double_value
+
+
+@_circuit_breaker("cpu")
+@_ttl_cached
+async def get_project_cpu_avg(project_id: str, ctx: Optional[ProjectContext] = None) -> float:
+    ctx = ctx or ProjectContext(project_id)
+    return await _project_metric_avg(ctx, CPU_METRIC)
+
+
+@_circuit_breaker("memory")
+@_ttl_cached
+async def get_project_mem_avg(project_id: str, ctx: Optional[ProjectContext] = None) -> float:
+    ctx = ctx or ProjectContext(project_id)
+    return await _project_metric_avg(ctx, MEM_METRIC)
+
+
+async def _get_name_map(ctx: ProjectContext) -> NameMap:
+    return await asyncio.to_thread(lambda: ctx.name_map)
+
+
+@_circuit_breaker("vms")
+@_ttl_cached
+async def list_running_vms(project_id: str, ctx: Optional[ProjectContext] = None) -> Tuple[int, Tuple[RunningVm, ...]]:
+    ctx = ctx or ProjectContext(project_id)
+    # Immutable: the cached result is shared by every caller within the TTL.
+    result = tuple(
+        RunningVm(name=name, zone=zone, machineType=machine_type, id=inst_id)
+        for inst_id, (name, zone, machine_type) in (await _get_name_map(ctx)).items()
+    )
     return len(result), result
 
 
-def get_per_instance_breakdown(project_id: str) -> List[Dict]:
+@_circuit_breaker("per_instance")
+@_ttl_cached
+async def get_per_instance_breakdown(project_id: str, ctx: Optional[ProjectContext] = None) -> Tuple[InstanceRow, ...]:
     """Return per-instance CPU and memory stats for running VMs with valid names."""
-    start, end = _now_interval()
-    interval = monitoring_v3.TimeInterval({
-        "start_time": {"seconds": int(start.timestamp())},
-        "end_time": {"seconds": int(end.timestamp())},
-    })
-    agg = monitoring_v3.Aggregation({
-        "alignment_period": {"seconds": ALIGN_SECONDS},
-        "per_series_aligner": monitoring_v3.Aggregation.Aligner.ALIGN_MEAN,
-    })
-    client = monitoring_v3.MetricServiceClient()
-
-    def fetch(metric_type: str) -> Dict[Tuple[str, str], float]:
-        flt = (
-            f'metric.type = "{metric_type}" '
-            f'AND resource.type = "gce_instance"'
-        )
-        req = monitoring_v3.ListTimeSeriesRequest(
-            name=f"projects/{project_id}",
-            filter=flt,
-            interval=interval,
-            view=monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
-            aggregation=agg,
-        )
-        vals = {}
-        for ts in client.list_time_series(request=req):
-            labels = ts.resource.labels
-            inst = labels.get("instance_id", "")
-            zone = labels.get("zone", "")
-            key = (inst, zone)
-            if ts.points:
-                vals[key] = ts.points[0].value.double_value
-        return vals
+    ctx = ctx or ProjectContext(project_id)
 
-    cpu = fetch("compute.googleapis.com/instance/cpu/utilization")
-    mem = fetch("agent.googleapis.com/memory/percent_used")
+    async def fetch(metric_type: str) -> Dict[Tuple[str, str], float]:
+        req = _ts_request_common(project_id, _METRIC_FILTERS[metric_type], ctx.interval, _AGG_INSTANCE_MEAN)
+        return await _series_values(req, ("instance_id", "zone"))
 
-    compute = build("compute", "v1", cache_discovery=False)
-    name_map = {}
-    req = compute.instances().aggregatedList(project=project_id)
-    while req is not None:
-        resp = req.execute()
-        for _, data in resp.get("items", {}).items():
-            for inst in data.get("instances", []) if data.get("instances") else []:
-                name_map[inst.get("id")] = {
-                    "name": inst.get("name"),
-                    "zone": inst.get("zone", "").split("/")[-1],
-                    "machineType": inst.get("machineType", "").split("/")[-1],
-                }
-        req = compute.instances().aggregatedList_next(previous_request=req, previous_response=resp)
+    # ListTimeSeries accepts a single metric type per filter, so the two
+    # metrics cannot share one call; overlap them with the name_map lookup.
+    cpu, mem, name_map = await asyncio.gather(
+        fetch(CPU_METRIC),
+        fetch(MEM_METRIC),
+        _get_name_map(ctx),
+    )
+    return _build_rows(cpu, mem, name_map)
 
+
+def _build_rows(
+    cpu: Dict[Tuple[str, str], float], mem: Dict[Tuple[str, str], float], name_map: NameMap
+) -> Tuple[InstanceRow, ...]:
     rows = []
     for (inst_id, zone), cpu_val in cpu.items():
-        meta = name_map.get(inst_id)   # only keep VMs with valid names
+        meta = name_map.get(inst_id)
         if not meta:
-            continue   # skip orphaned metrics (numeric IDs only)
-        rows.append({
-            "instance": meta["name"],
-            "zone": meta["zone"],
-            "machineType": meta["machineType"],
-            "cpu_utilization_pct": round(cpu_val * 100.0, 2),
-            "memory_used_pct": round(mem.get((inst_id, zone), float("nan")), 2),
-        })
-    return rows
+            continue   # no running instance for this series
+        name, vm_zone, machine_type = meta
+        rows.append(InstanceRow(
+            instance=name,
+            zone=vm_zone,
+            machineType=machine_type,
+            cpu_utilization_pct=round(cpu_val * 100.0, 2),
+            memory_used_pct=round(mem.get((inst_id, zone), float("nan")), 2),
+        ))
+    return tuple(rows)
+
+
+def _scoped_request(
+    scoping_project: str,
+    project_ids: Sequence[str],
+    metric_type: str,
+    interval: monitoring_v3.TimeInterval,
+    aggregation: monitoring_v3.Aggregation,
+) -> monitoring_v3.ListTimeSeriesRequest:
+    projects = ", ".join(f'"{pid}"' for pid in project_ids)
+    flt = f"{_METRIC_FILTERS[metric_type]} AND resource.label.project_id = one_of({projects})"
+    return _ts_request_common(scoping_project, flt, interval, aggregation)
+
+
+async def get_scoped_project_avgs(
+    scoping_project: str,
+    project_ids: Sequence[str],
+    metric_type: str,
+    offset: int = INGEST_LAG_SECONDS,
+) -> Dict[str, float]:
+    """Return each project's average of metric_type from one call on its metrics scope.
+
+    scoping_project must host a metrics scope that includes every project in
+    project_ids; projects without data map to NaN.
+    """
+    req = _scoped_request(scoping_project, project_ids, metric_type, _time_interval(offset), _AGG_SCOPED_PROJECT_MEAN)
+    vals = await _series_values(req, ("project_id",))
+    return {pid: vals.get((pid,), float("nan")) for pid in project_ids}
+
+
+async def get_scoped_per_instance_breakdown(
+    scoping_project: str,
+    project_ids: Sequence[str],
+    ctxs: Optional[Mapping[str, ProjectContext]] = None,
+    offset: int = INGEST_LAG_SECONDS,
+) -> Dict[str, Any]:
+    """Per-instance rows for every project, with one CPU and one memory call in total.
+
+    VM names still come from each project's own aggregatedList (name_map). A
+    project whose name_map lookup fails maps to that exception instead of rows,
+    so one project's Compute error does not fail the others.
+    """
+    ctxs = ctxs or {}
+    interval = _time_interval(offset)
+    label_keys = ("project_id", "instance_id", "zone")
+
+    def scoped(metric_type: str) -> monitoring_v3.ListTimeSeriesRequest:
+        return _scoped_request(scoping_project, project_ids, metric_type, interval, _AGG_SCOPED_INSTANCE_MEAN)
+
+    cpu, mem, name_maps = await asyncio.gather(
+        _series_values(scoped(CPU_METRIC), label_keys),
+        _series_values(scoped(MEM_METRIC), label_keys),
+        asyncio.gather(
+            *(_get_name_map(ctxs.get(pid) or ProjectContext(pid)) for pid in project_ids),
+            return_exceptions=True,
+        ),
+    )
+
+    cpu_by_project: Dict[str, Dict[Tuple[str, str], float]] = {pid: {} for pid in project_ids}
+    mem_by_project: Dict[str, Dict[Tuple[str, str], float]] = {pid: {} for pid in project_ids}
+    for vals, by_project in ((cpu, cpu_by_project), (mem, mem_by_project)):
+        for (pid, inst_id, zone), val in vals.items():
+            if pid in by_project:
+                by_project[pid][(inst_id, zone)] = val
+
+    return {
+        pid: name_map
+        if isinstance(name_map, BaseException)
+        else _build_rows(cpu_by_project[pid], mem_by_project[pid], name_map)
+        for pid, name_map in zip(project_ids, name_maps)
+    }
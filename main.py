@@ -6,17 +6,26 @@ Monitors multiple GCP projects in one run.
 
 Usage:
   python main.py --all
+  python main.py --all --scoping-project <SCOPING_PROJECT_ID>
   python main.py --project <PROJECT_ID>
 """
 
 import argparse
+import asyncio
+from typing import List
+
 from google.api_core import exceptions as gax_exceptions
-from googleapiclient.errors import HttpError
 from health_agent import (
+    CPU_METRIC,
+    MEM_METRIC,
+    ProjectContext,
+    degraded_checks,
     get_project_cpu_avg,
     get_project_mem_avg,
     list_running_vms,
     get_per_instance_breakdown,
+    get_scoped_project_avgs,
+    get_scoped_per_instance_breakdown,
 )
 
 # 🔹 Define the projects you want to monitor
@@ -29,55 +38,147 @@ PROJECTS = [
     "km-dev-434106",   # include dev for testing
 ]
 
-def run_for_project(project_id: str):
-    try:
-        cpu_avg = get_project_cpu_avg(project_id)
-    except gax_exceptions.GoogleAPICallError as e:
-        print(f"[!] CPU query failed for {project_id}: {e}")
+MAX_CONCURRENT_PROJECTS = 4
+
+async def run_for_project(project_id: str) -> List[str]:
+    """Query one project and return its report lines (printed by the caller)."""
+    lines: List[str] = []
+    out = lines.append
+
+    # The four queries are independent round-trips, so issue them together;
+    # the shared context makes the two VM lookups share one aggregatedList walk.
+    ctx = ProjectContext(project_id)
+    cpu_avg, mem_avg, vm_result, rows = await asyncio.gather(
+        get_project_cpu_avg(project_id, ctx),
+        get_project_mem_avg(project_id, ctx),
+        list_running_vms(project_id, ctx),
+        get_per_instance_breakdown(project_id, ctx),
+        return_exceptions=True,
+    )
+
+    if isinstance(cpu_avg, gax_exceptions.GoogleAPIError):
+        out(f"[!] CPU query failed for {project_id}: {cpu_avg}")
         cpu_avg = float("nan")
+    elif isinstance(cpu_avg, BaseException):
+        raise cpu_avg
 
-    try:
-        mem_avg = get_project_mem_avg(project_id)
-    except gax_exceptions.GoogleAPICallError as e:
-        print(f"[!] Memory query failed for {project_id}: {e}")
+    if isinstance(mem_avg, gax_exceptions.GoogleAPIError):
+        out(f"[!] Memory query failed for {project_id}: {mem_avg}")
         mem_avg = float("nan")
+    elif isinstance(mem_avg, BaseException):
+        raise mem_avg
+
+    _report(out, project_id, cpu_avg, mem_avg, vm_result, rows)
+    return lines
+
+async def batch_health_for_projects(project_ids: List[str], scoping_project: str) -> None:
+    """Report on every project using one ListTimeSeries call per metric.
+
+    scoping_project must host a metrics scope that includes all project_ids.
+    VM inventory is still listed per project.
+    """
+    ctxs = {pid: ProjectContext(pid) for pid in project_ids}
+    cpu_avgs, mem_avgs, breakdowns, *vm_results = await asyncio.gather(
+        get_scoped_project_avgs(scoping_project, project_ids, CPU_METRIC),
+        get_scoped_project_avgs(scoping_project, project_ids, MEM_METRIC),
+        get_scoped_per_instance_breakdown(scoping_project, project_ids, ctxs),
+        *(list_running_vms(pid, ctxs[pid]) for pid in project_ids),
+        return_exceptions=True,
+    )
+
+    if isinstance(cpu_avgs, gax_exceptions.GoogleAPIError):
+        print(f"[!] CPU query failed for scope {scoping_project}: {cpu_avgs}")
+        cpu_avgs = {}
+    elif isinstance(cpu_avgs, BaseException):
+        raise cpu_avgs
 
-    try:
-        vm_count, vms = list_running_vms(project_id)
-    except HttpError as e:
-        print(f"[!] VM list failed for {project_id}: {e}")
-        vm_count, vms = 0, []
+    if isinstance(mem_avgs, gax_exceptions.GoogleAPIError):
+        print(f"[!] Memory query failed for scope {scoping_project}: {mem_avgs}")
+        mem_avgs = {}
+    elif isinstance(mem_avgs, BaseException):
+        raise mem_avgs
 
-    print("\n=== GCP Project Health (last 10 minutes) ===")
-    print(f"Project: {project_id}")
-    print(f"Average CPU Utilization: {('%.2f%%' % (cpu_avg*100)) if cpu_avg==cpu_avg else 'N/A'}")
-    print(f"Average Memory Used: {('%.2f%%' % (mem_avg)) if mem_avg==mem_avg else 'N/A'}")
-    print(f"RUNNING VMs: {vm_count}")
+    for pid, vm_result in zip(project_ids, vm_results):
+        lines: List[str] = []
+        rows = breakdowns if isinstance(breakdowns, BaseException) else breakdowns[pid]
+        # As in run_all, one project's failure must not hide the others' reports.
+        try:
+            _report(lines.append, pid, cpu_avgs.get(pid, float("nan")), mem_avgs.get(pid, float("nan")), vm_result, rows)
+        except Exception as e:
+            lines = [f"\n[!] {pid} failed: {e!r}"]
+        print("\n".join(lines))
+
+def _report(out, project_id: str, cpu_avg: float, mem_avg: float, vm_result, rows) -> None:
+    if isinstance(vm_result, gax_exceptions.GoogleAPIError):
+        out(f"[!] VM list failed for {project_id}: {vm_result}")
+        vm_count, vms = 0, ()
+    elif isinstance(vm_result, BaseException):
+        raise vm_result
+    else:
+        vm_count, vms = vm_result
+
+    out("\n=== GCP Project Health (last 10 minutes) ===")
+    out(f"Project: {project_id}")
+    out(f"Average CPU Utilization: {('%.2f%%' % (cpu_avg*100)) if cpu_avg==cpu_avg else 'N/A'}")
+    out(f"Average Memory Used: {('%.2f%%' % (mem_avg)) if mem_avg==mem_avg else 'N/A'}")
+    out(f"RUNNING VMs: {vm_count}")
+    degraded = degraded_checks(project_id)
+    if degraded:
+        out(f"[!] Degraded (circuit open, showing no data): {', '.join(degraded)}")
 
     if vm_count == 0:
         return
 
     # 🔹 Always print per-instance results
-    print("\n-- Per-instance (avg of last 10m) --")
-    rows = get_per_instance_breakdown(project_id)
+    out("\n-- Per-instance (avg of last 10m) --")
+    if isinstance(rows, gax_exceptions.GoogleAPIError):
+        out(f"[!] Per-instance query failed for {project_id}: {rows}")
+        return
+    if isinstance(rows, BaseException):
+        raise rows
+    if "per_instance" in degraded:
+        # The breaker's empty fallback says nothing about the Ops Agent.
+        out(f"[!] Per-instance query failed for {project_id}: circuit open")
+        return
     if not rows:
-        print("No per-instance metrics found (ensure Ops Agent is installed).")
+        out("No per-instance metrics found (ensure Ops Agent is installed).")
     else:
-        print(f"{'INSTANCE':32} {'ZONE':15} {'TYPE':20} {'CPU%':>8} {'MEM%':>8}")
-        for r in sorted(rows, key=lambda x: (x['zone'], x['instance'])):
-            print(f"{r['instance'][:32]:32} {r['zone'][:15]:15} {r['machineType'][:20]:20} {r['cpu_utilization_pct']:8.2f} {r['memory_used_pct']:8.2f}")
+        out(f"{'INSTANCE':32} {'ZONE':15} {'TYPE':20} {'CPU%':>8} {'MEM%':>8}")
+        for r in sorted(rows, key=lambda x: (x.zone, x.instance)):
+            out(f"{r.instance[:32]:32} {r.zone[:15]:15} {r.machineType[:20]:20} {r.cpu_utilization_pct:8.2f} {r.memory_used_pct:8.2f}")
+
+async def run_all(project_ids: List[str]) -> None:
+    # Projects are independent; cap concurrency to stay under Monitoring QPS quotas.
+    sem = asyncio.Semaphore(MAX_CONCURRENT_PROJECTS)
+
+    async def guarded(pid: str) -> List[str]:
+        # One project's failure must not discard the other projects' reports.
+        async with sem:
+            try:
+                return await run_for_project(pid)
+            except Exception as e:
+                return [f"\n[!] {pid} failed: {e!r}"]
+
+    reports = await asyncio.gather(*(guarded(pid) for pid in project_ids))
+    for lines in reports:
+        print("\n".join(lines))
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--project", help="Run for a single project ID")
     parser.add_argument("--all", action="store_true", help="Run for all projects in PROJECTS list")
+    parser.add_argument(
+        "--scoping-project",
+        help="With --all, query every project through this project's metrics scope in one call per metric",
+    )
     args = parser.parse_args()
 
-    if args.all:
-        for pid in PROJECTS:
-            run_for_project(pid)
+    if args.all and args.scoping_project:
+        asyncio.run(batch_health_for_projects(PROJECTS, args.scoping_project))
+    elif args.all:
+        asyncio.run(run_all(PROJECTS))
     elif args.project:
-        run_for_project(args.project)
+        print("\n".join(asyncio.run(run_for_project(args.project))))
     else:
         parser.print_help()
 